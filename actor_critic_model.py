@@ -9,13 +9,16 @@ class ActorCriticModel(nn.Module):
 
         self.hidden_dim = hidden_dim
 
-        # Convolutional layers
-        self.conv1 = nn.Conv2d(in_channels=input_shape[0], out_channels=32, kernel_size=4, stride=4)
+        # Convolutional layers sized for the (2*predator_scope+1)^2
+        # observation window: 11 -> 8 -> 3 -> 1 for the default scope of 5
+        self.conv1 = nn.Conv2d(in_channels=input_shape[0], out_channels=32, kernel_size=4, stride=1)
         self.conv2 = nn.Conv2d(in_channels=32, out_channels=64, kernel_size=3, stride=2)
-        self.conv3 = nn.Conv2d(in_channels=64, out_channels=256, kernel_size=3, stride=2)
+        self.conv3 = nn.Conv2d(in_channels=64, out_channels=256, kernel_size=3, stride=1)
 
-        # LSTM layer
-        self.lstm = nn.LSTM(input_size=256, hidden_size=256, batch_first=True)
+        # LSTM layer; its input size is whatever the conv stack flattens to
+        with torch.no_grad():
+            conv_out = self.conv3(self.conv2(self.conv1(torch.zeros(1, *input_shape))))
+        self.lstm = nn.LSTM(input_size=conv_out.numel(), hidden_size=256, batch_first=True)
 
         # Fully connected layers for state-value and advantage-value
         self.fc_output_layer = nn.Linear(256, 128)
@@ -1,5 +1,82 @@
 import random
 
+import numpy as np
+
+
+class AgentSoA:
+    """Structure-of-Arrays storage for agents.
+
+    Instead of one Python object per agent, every agent is a row index into
+    parallel NumPy arrays. This keeps the per-step work on positions, roles
+    and health inside vectorized array operations instead of Python-level
+    attribute lookups.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.pos_x = np.zeros(capacity, dtype=np.int32)
+        self.pos_y = np.zeros(capacity, dtype=np.int32)
+        self.role = np.zeros(capacity, dtype=np.int8)
+        self.health = np.zeros(capacity, dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=np.bool_)
+        self.size = 0  # number of rows allocated so far
+        self._free_indices = []  # rows of removed agents, reused on allocate
+        self._pending_free = []  # rows removed since the last flush_removed
+
+    def clear(self):
+        """Removes all agents."""
+        self.alive[:] = False
+        self.size = 0
+        self._free_indices.clear()
+        self._pending_free.clear()
+
+    def _grow(self):
+        """Doubles the capacity of every array, preserving contents."""
+        new_capacity = self.capacity * 2
+        for name in ('pos_x', 'pos_y', 'role', 'health', 'alive'):
+            old = getattr(self, name)
+            grown = np.zeros(new_capacity, dtype=old.dtype)
+            grown[:self.capacity] = old
+            setattr(self, name, grown)
+        self.capacity = new_capacity
+
+    def allocate(self, role, x, y, health):
+        """Adds a new agent and returns its row index, reusing freed rows."""
+        if self._free_indices:
+            i = self._free_indices.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow()
+            i = self.size
+            self.size += 1
+        self.pos_x[i] = x
+        self.pos_y[i] = y
+        self.role[i] = role
+        self.health[i] = health
+        self.alive[i] = True
+        return i
+
+    def remove(self, indices):
+        """Removes the agent(s) at the given row index or index array.
+
+        Freed rows are parked until flush_removed, so an id removed during
+        a step cannot be handed out again to an agent born in the same
+        step; only then do they return to the free list for allocate.
+        """
+        self.alive[indices] = False
+        self._pending_free.extend(int(k) for k in np.atleast_1d(indices))
+
+    def flush_removed(self):
+        """Releases the rows of agents removed since the last flush for
+        reuse; the environment calls this at the end of each step."""
+        self._free_indices.extend(self._pending_free)
+        self._pending_free.clear()
+
+    def alive_indices(self):
+        """Row indices of all living agents."""
+        return np.flatnonzero(self.alive[:self.size])
+
+
 class Agent():
     def __init__(self, id, role, position):
         self.id = id
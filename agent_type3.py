@@ -1,12 +1,17 @@
 import random
 
+# Role codes (match the grid codes in env_type1), so role checks are
+# integer comparisons instead of string tests
+ROLE_PREDATOR = 2
+ROLE_PREY = 3
+
 class AgentType3():
     def __init__(self, id, role, position):
         self.id = id
         self.role = role
         self.position = position
 
-        if role == 'predator':
+        if role == ROLE_PREDATOR:
             self.health = random.uniform(0.5, 1)
             self.speed = random.uniform(0.5, 1.5)
             self.attack = random.uniform(0.5, 1.5)
@@ -4,7 +4,64 @@ from pettingzoo.utils.env import ParallelEnv
 import numpy as np
 import random
 
-from agent import Agent
+from agent import AgentSoA
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; NumPy paths are used without it
+    njit = None
+
+# Grid cell contents
+KIND_EMPTY = 0
+KIND_WALL = 1
+KIND_PREDATOR = 2
+KIND_PREY = 3
+
+# Role codes stored in AgentSoA.role (match the grid codes)
+ROLE_PREDATOR = KIND_PREDATOR
+ROLE_PREY = KIND_PREY
+
+# Predator health ceiling; keeps live observations inside the range the
+# quantized replay buffer can represent (255 / replay_buffer.OBS_SCALE)
+MAX_HEALTH = 2.55
+
+# Movement deltas indexed by action: 0=stay, 1=up, 2=down, 3=left, 4=right
+DX = np.array([0, -1, 1, 0, 0], dtype=np.int32)
+DY = np.array([0, 0, 0, -1, 1], dtype=np.int32)
+
+
+def _hunt_kernel(grid_kind, grid_idx, predators, pos_x, pos_y, scope, height, width):
+    """Sequential hunting scan: for each predator in order, picks the
+    nearest prey in its scope window, eats it (clearing its cell so later
+    predators cannot target it) and records the eaten agent row (-1 when
+    no prey was in range). Compiled with numba when it is available."""
+    eaten = np.full(predators.shape[0], -1, dtype=np.int32)
+    for k in range(predators.shape[0]):
+        px = pos_x[predators[k]]
+        py = pos_y[predators[k]]
+        best = 1 << 30
+        bx, by = -1, -1
+        for dx in range(-scope, scope + 1):
+            for dy in range(-scope, scope + 1):
+                if dx == 0 and dy == 0:
+                    continue
+                nx = (px + dx) % height
+                ny = (py + dy) % width
+                if grid_kind[nx, ny] == KIND_PREY:
+                    distance = abs(dx) + abs(dy)  # Manhattan
+                    if distance < best:
+                        best = distance
+                        bx, by = nx, ny
+        if bx >= 0:
+            eaten[k] = grid_idx[bx, by]
+            grid_kind[bx, by] = KIND_EMPTY
+            grid_idx[bx, by] = -1
+    return eaten
+
+
+if njit is not None:
+    _hunt_kernel = njit(cache=True)(_hunt_kernel)
+
 
 class PredatorPreyEnv(ParallelEnv):
     def __init__(self,
@@ -36,159 +93,281 @@ class PredatorPreyEnv(ParallelEnv):
         self.max_num_predators = 10000
         self.max_num_preys = 10000
 
-        self.agents = []
+        # Agents live in parallel arrays; a row index identifies an agent
+        self.soa = AgentSoA(num_predators + num_prey + 64)
         self.walls_positions = []
 
-        # Initialize the grid
-        self.grid = np.zeros(self.grid_size, dtype=object)
+        # Grid as two integer layers: what occupies a cell and which agent
+        # row sits there (-1 when none)
+        self.grid_kind = np.zeros(self.grid_size, dtype=np.int8)
+        self.grid_idx = np.full(self.grid_size, -1, dtype=np.int32)
+
+        # Walls never move; the mask is built once per reset
+        self.wall_mask = np.zeros(self.grid_size, dtype=np.bool_)
+
+        # Alive/per-role index arrays, rebuilt only after births or deaths
+        self._agents_cache = None
+        self._role_cache = None
+
+        # Trainers gathering observations on their own device set this to
+        # False so step() skips the NumPy observation batch
+        self.build_observations = True
+
+        # Window offsets for slicing the observation around an agent, and
+        # Manhattan distances of every window cell from its center
+        self._offs = np.arange(-predator_scope, predator_scope + 1)
+        self._dist_table = np.abs(self._offs)[:, None] + np.abs(self._offs)[None, :]
 
         # self.reset()
 
+    @property
+    def agents(self):
+        """Row indices of all living agents."""
+        if self._agents_cache is None:
+            self._agents_cache = self.soa.alive_indices()
+        return self._agents_cache
+
+    def _role_indices(self):
+        """Row indices of living (predators, preys), cached between calls."""
+        if self._role_cache is None:
+            idx = self.agents
+            roles = self.soa.role[idx]
+            self._role_cache = (idx[roles == ROLE_PREDATOR], idx[roles == ROLE_PREY])
+        return self._role_cache
+
+    def _invalidate_agent_cache(self):
+        """Drops the cached index arrays; called after births and deaths."""
+        self._agents_cache = None
+        self._role_cache = None
+
+    def agent_id(self, i):
+        """Returns the string id of agent row i, derived from the index."""
+        prefix = "pr" if self.soa.role[i] == ROLE_PREDATOR else "py"
+        return f"{prefix}_{i}"
+
+    def agent_index(self, agent_id):
+        """Maps a string agent id back to its row index."""
+        return int(agent_id.split("_", 1)[1])
+
+    def count_predators(self):
+        """Number of living predators."""
+        return int(self._role_indices()[0].size)
+
+    def count_preys(self):
+        """Number of living preys."""
+        return int(self._role_indices()[1].size)
+
+    def _random_empty_cell(self, max_attempts=200):
+        """Draws a random empty grid cell, or None when no empty cell is
+        found within max_attempts draws (the grid is essentially full)."""
+        for _ in range(max_attempts):
+            x, y = random.randint(0, self.grid_size[0] - 1), random.randint(0, self.grid_size[1] - 1)
+            if self.grid_kind[x, y] == KIND_EMPTY:
+                return x, y
+        return None
+
+    def _spawn(self, role, x, y):
+        """Places a new agent on the grid and returns its row index."""
+        if role == ROLE_PREDATOR:
+            health = random.uniform(0.5, 1)
+        else:
+            health = 1.0
+        i = self.soa.allocate(role, x, y, health)
+        self.grid_kind[x, y] = role
+        self.grid_idx[x, y] = i
+        self._invalidate_agent_cache()
+        return i
+
     def reset(self):
         """Resets the environment."""
-        self.grid.fill(0)
+        self.grid_kind.fill(KIND_EMPTY)
+        self.grid_idx.fill(-1)
+        self.soa.clear()
+        self._invalidate_agent_cache()
         self.walls_positions.clear()
 
-        # Place walls
-        for _ in range(self.num_walls):
-            while True:
-                x, y = random.randint(0, self.grid_size[0] - 1), random.randint(0, self.grid_size[1] - 1)
-                if self.grid[x, y] == 0:
-                    self.grid[x, y] = -1  # Wall
-                    self.walls_positions.append((x, y))
-                    break
+        # Place all walls at once; they stay fixed until the next reset
+        cells = random.sample(range(self.grid_size[0] * self.grid_size[1]), self.num_walls)
+        self.wall_mask[:] = False
+        self.wall_mask.flat[cells] = True
+        self.grid_kind[self.wall_mask] = KIND_WALL
+        self.walls_positions.extend(
+            (c // self.grid_size[1], c % self.grid_size[1]) for c in cells)
 
         # Create and place predators
-        for i in range(self.num_predators):
-            while True:
-                x, y = random.randint(0, self.grid_size[0] - 1), random.randint(0, self.grid_size[1] - 1)
-                if self.grid[x, y] == 0:
-                    predator = Agent(f"pr_{i}", "predator", (x, y))
-                    self.agents.append(predator)
-                    self.grid[x, y] = predator  # Predator
-                    break
+        for _ in range(self.num_predators):
+            cell = self._random_empty_cell()
+            if cell is None:
+                break
+            self._spawn(ROLE_PREDATOR, *cell)
 
         # Create and place preys
-        for i in range(self.num_prey):
-            while True:
-                x, y = random.randint(0, self.grid_size[0] - 1), random.randint(0, self.grid_size[1] - 1)
-                if self.grid[x, y] == 0:
-                    prey = Agent(f"py_{i}", "prey", (x, y))
-                    self.agents.append(prey)
-                    self.grid[x, y] = prey  # Prey
-                    break
+        for _ in range(self.num_prey):
+            cell = self._random_empty_cell()
+            if cell is None:
+                break
+            self._spawn(ROLE_PREY, *cell)
 
-        return {agent.id: self.get_observation(agent) for agent in self.agents}
+        indices, obs_batch = self.get_all_observations()
+        return {self.agent_id(i): obs_batch[k] for k, i in enumerate(indices)}
 
     def agents_move(self, actions):
         """Make a move of each agent"""
-        new_positions = {}
-
-        for agent in self.agents:
-            x, y = agent.get_position()
-            new_x, new_y = x, y
-
-            # random actions for now
-            action = actions[agent.id]
-
-            if action == 1:  # up
-                new_x = (x - 1) % self.grid_size[0]
-            elif action == 2:  # down
-                new_x = (x + 1) % self.grid_size[0]
-            elif action == 3:  # left
-                new_y = (y - 1) % self.grid_size[1]
-            elif action == 4:  # right
-                new_y = (y + 1) % self.grid_size[1]
-
-            if self.grid[new_x, new_y] == 0:  # Move if the cell is empty
-                new_positions[agent.id] = (new_x, new_y)
-            else:  # Stay in place if the cell is occupied
-                new_positions[agent.id] = (x, y)
-
-        # Update grid and agent positions
-        self.grid.fill(0)
-        for wall in self.walls_positions:
-            self.grid[wall[0], wall[1]] = -1
-
-        for agent in self.agents:
-            x, y = new_positions[agent.id]
-            self.grid[x, y] = agent
-            agent.set_position((x, y))
-
-    def get_observation(self, agent):
+        idx = self.agents
+        if idx.size == 0:
+            return
+
+        acts = np.array([int(actions.get(self.agent_id(i), 0)) for i in idx],
+                        dtype=np.int32)
+
+        x = self.soa.pos_x[idx]
+        y = self.soa.pos_y[idx]
+        new_x = (x + DX[acts]) % self.grid_size[0]
+        new_y = (y + DY[acts]) % self.grid_size[1]
+
+        # Stay in place if the target cell was occupied before the move
+        blocked = self.grid_kind[new_x, new_y] != KIND_EMPTY
+        new_x = np.where(blocked, x, new_x)
+        new_y = np.where(blocked, y, new_y)
+
+        # Resolve conflicts: when several agents claim the same empty cell,
+        # the first one (in index order) wins and the others stay in place.
+        # Staying is always safe because an occupied old cell was never a
+        # legal target for anyone else.
+        flat_targets = new_x * self.grid_size[1] + new_y
+        _, first_claim = np.unique(flat_targets, return_index=True)
+        winners = np.zeros(idx.size, dtype=np.bool_)
+        winners[first_claim] = True
+        new_x = np.where(winners, new_x, x)
+        new_y = np.where(winners, new_y, y)
+
+        # Clear the old cells and scatter everyone to their final cells
+        self.grid_kind[x, y] = KIND_EMPTY
+        self.grid_idx[x, y] = -1
+        self.grid_kind[new_x, new_y] = self.soa.role[idx]
+        self.grid_idx[new_x, new_y] = idx
+        self.soa.pos_x[idx] = new_x
+        self.soa.pos_y[idx] = new_y
+
+    def get_observation(self, i):
         """
-        Returns a local observation (7 channels):
+        Returns a local observation (4 channels):
           0: wall layer,
           1: predator layer,
           2: prey layer,
           3: health level,
-        Observation size: (5*predator_scope+1, 5*predator_scope+1, 4)
+        Observation size: (4, 2*predator_scope+1, 2*predator_scope+1)
         """
-        ax, ay = agent.get_position()
-        size = self.predator_scope * 8 + 1
+        ax, ay = int(self.soa.pos_x[i]), int(self.soa.pos_y[i])
+
+        # Wrap-around window indices around the agent
+        xs = (ax + self._offs) % self.grid_size[0]
+        ys = (ay + self._offs) % self.grid_size[1]
+        patch_kind = self.grid_kind[np.ix_(xs, ys)]
+        patch_idx = self.grid_idx[np.ix_(xs, ys)]
 
-        wall_layer = np.zeros((size, size), dtype=int)
-        predator_layer = np.zeros((size, size), dtype=int)
-        prey_layer = np.zeros((size, size), dtype=int)
-        health_layer = np.zeros((size, size), dtype=float)
+        wall_layer = (patch_kind == KIND_WALL).astype(np.float32)
+        predator_layer = (patch_kind == KIND_PREDATOR).astype(np.float32)
+        prey_layer = (patch_kind == KIND_PREY).astype(np.float32)
+        health_layer = np.where(patch_idx >= 0,
+                                self.soa.health[np.maximum(patch_idx, 0)],
+                                0.0).astype(np.float32)
 
-        for dx in range(-5 * self.predator_scope, 5 * self.predator_scope + 1):
-            for dy in range(-5 * self.predator_scope, 5 * self.predator_scope + 1):
-                nx, ny = (ax + dx) % self.grid_size[0], (ay + dy) % self.grid_size[1]
-                local_x, local_y = dx + self.predator_scope, dy + self.predator_scope
+        return np.stack([wall_layer, predator_layer, prey_layer, health_layer], axis=0)
 
-                if self.grid[nx, ny] == -1:
-                    wall_layer[local_x, local_y] = 1
-                elif type(self.grid[nx, ny]) == Agent and self.grid[nx, ny].role == 'predator':
-                    predator_layer[local_x, local_y] = 1
-                    health_layer[local_x, local_y] = self.grid[nx, ny].health
-                elif type(self.grid[nx, ny]) == Agent and self.grid[nx, ny].role == 'prey':
-                    prey_layer[local_x, local_y] = 1
-                    health_layer[local_x, local_y] = self.grid[nx, ny].health
+    def get_all_observations(self):
+        """
+        Builds the observations of every living agent with one gather.
 
+        Returns (indices, batch) where indices are the agent rows and batch
+        has shape (N, 4, 2*predator_scope+1, 2*predator_scope+1).
+        """
+        idx = self.agents
+        size = self.predator_scope * 2 + 1
+        if idx.size == 0:
+            return idx, np.zeros((0, 4, size, size), dtype=np.float32)
+
+        # (N, S) wrap-around window indices per agent, then one fancy-index
+        # over the whole grid giving (N, S, S) patches
+        xs = (self.soa.pos_x[idx][:, None] + self._offs[None, :]) % self.grid_size[0]
+        ys = (self.soa.pos_y[idx][:, None] + self._offs[None, :]) % self.grid_size[1]
+        patch_kind = self.grid_kind[xs[:, :, None], ys[:, None, :]]
+        patch_idx = self.grid_idx[xs[:, :, None], ys[:, None, :]]
+
+        wall_layer = patch_kind == KIND_WALL
+        predator_layer = patch_kind == KIND_PREDATOR
+        prey_layer = patch_kind == KIND_PREY
+        health_layer = np.where(patch_idx >= 0,
+                                self.soa.health[np.maximum(patch_idx, 0)],
+                                0.0)
+
+        batch = np.stack([wall_layer, predator_layer, prey_layer, health_layer],
+                         axis=1).astype(np.float32)
+        return idx, batch
 
-        return np.stack([wall_layer, predator_layer, prey_layer, health_layer], axis=0)
     def hunting(self, rewards, dones):
         """Handle predator prey interaction - hunting"""
-        for predator in [a for a in self.agents if "predator" in a.role]:
-            px, py = predator.get_position()
-            prey_in_scope = []
-
-            for dx in range(-self.predator_scope, self.predator_scope + 1):
-                for dy in range(-self.predator_scope, self.predator_scope + 1):
-                    if dx == 0 and dy == 0:
-                        continue
-                    nx, ny = (px + dx) % self.grid_size[0], (py + dy) % self.grid_size[1]
-                    if type(self.grid[nx, ny]) == Agent and self.grid[nx, ny].role == 'prey':
-                        distance = abs(dx) + abs(dy)  # Manhattan
-                        prey_in_scope.append((distance, (nx, ny)))
-
-            if prey_in_scope:
-                # Kill the nearest prey
-                prey_in_scope.sort()
-                target_prey_pos = prey_in_scope[0][1]
-                for prey in self.agents:
-                    pos = prey.get_position()
-                    if pos == target_prey_pos:
-                        self.agents.remove(prey)
-                        self.grid[target_prey_pos[0], target_prey_pos[1]] = 0
-                        rewards[predator.id] += 1  # Reward for eating prey
-                        rewards[prey.id] += -1
-                        predator.add_health(self.health_gained)  # Add constant value
-                        dones[prey.id] = True
-                        break
+        predators = self._role_indices()[0]
+
+        if njit is not None and predators.size > 0:
+            # JIT-compiled scan: the whole sequential predator loop runs as
+            # native code, mutating the grid as prey get eaten
+            eaten = _hunt_kernel(self.grid_kind, self.grid_idx,
+                                 predators.astype(np.int32),
+                                 self.soa.pos_x, self.soa.pos_y,
+                                 self.predator_scope,
+                                 self.grid_size[0], self.grid_size[1])
+            for k, predator in enumerate(predators):
+                prey = int(eaten[k])
+                if prey >= 0:
+                    self.soa.remove(prey)
+                    self._invalidate_agent_cache()
+                    rewards[self.agent_id(predator)] += 1  # Reward for eating prey
+                    rewards[self.agent_id(prey)] += -1
+                    self.soa.health[predator] = min(
+                    self.soa.health[predator] + self.health_gained, MAX_HEALTH)
+                    dones[self.agent_id(prey)] = True
+            return rewards, dones
+
+        for predator in predators:
+            px, py = int(self.soa.pos_x[predator]), int(self.soa.pos_y[predator])
+
+            # Slice the scope window and mask out everything but prey
+            xs = (px + self._offs) % self.grid_size[0]
+            ys = (py + self._offs) % self.grid_size[1]
+            prey_mask = self.grid_kind[np.ix_(xs, ys)] == KIND_PREY
+
+            if prey_mask.any():
+                # Kill the nearest prey (Manhattan distance)
+                local = np.argmin(np.where(prey_mask, self._dist_table, 255))
+                lx, ly = divmod(local, prey_mask.shape[1])
+                nx, ny = int(xs[lx]), int(ys[ly])
+                prey = int(self.grid_idx[nx, ny])
+                self.soa.remove(prey)
+                self._invalidate_agent_cache()
+                self.grid_kind[nx, ny] = KIND_EMPTY
+                self.grid_idx[nx, ny] = -1
+                rewards[self.agent_id(predator)] += 1  # Reward for eating prey
+                rewards[self.agent_id(prey)] += -1
+                self.soa.health[predator] = min(
+                    self.soa.health[predator] + self.health_gained, MAX_HEALTH)
+                dones[self.agent_id(prey)] = True
 
         return rewards, dones
 
     def predator_hunger(self, dones):
         """Decrease predator health and remove dead predators"""
-        for predator in [a for a in self.agents if "predator" in a.role]:
-            predator.add_health(-self.health_penalty)
-            if predator.health <= 0:
-                px, py = predator.get_position()
-                self.agents.remove(predator)
-                self.grid[px, py] = 0
-                dones[predator.id] = True
+        predators = self._role_indices()[0]
+        self.soa.health[predators] -= self.health_penalty
+
+        dead = predators[self.soa.health[predators] <= 0]
+        self.grid_kind[self.soa.pos_x[dead], self.soa.pos_y[dead]] = KIND_EMPTY
+        self.grid_idx[self.soa.pos_x[dead], self.soa.pos_y[dead]] = -1
+        if dead.size > 0:
+            self.soa.remove(dead)
+            self._invalidate_agent_cache()
+        for predator in dead:
+            dones[self.agent_id(predator)] = True
         return dones
 
     def generate_new_agents(self, p_predator=0.003, p_prey=0.006):
@@ -203,8 +382,8 @@ class PredatorPreyEnv(ParallelEnv):
         selected parents.
         """
         # Calculate the number of new predators and prey
-        num_predators = len([a for a in self.agents if "predator" in a.role])
-        num_preys = len([a for a in self.agents if "prey" in a.role])
+        num_predators = self.count_predators()
+        num_preys = self.count_preys()
 
         new_preys = 0
         new_predators = 0
@@ -215,25 +394,17 @@ class PredatorPreyEnv(ParallelEnv):
 
         # Add new predators
         for _ in range(new_predators):
-            predator_id = f"pr_{len([a for a in self.agents if 'predator' in a.role])}"
-            while True:
-                x, y = random.randint(0, self.grid_size[0] - 1), random.randint(0, self.grid_size[1] - 1)
-                if self.grid[x, y] == 0:  # Empty cell
-                    created_agent = Agent(predator_id, 'predator', (x, y))
-                    self.grid[x, y] = created_agent  # Predator
-                    self.agents.append(created_agent)
-                    break
+            cell = self._random_empty_cell()
+            if cell is None:
+                break
+            self._spawn(ROLE_PREDATOR, *cell)
 
         # Add new preys
         for _ in range(new_preys):
-            prey_id = f"py_{len([a for a in self.agents if 'prey' in a.role])}"
-            while True:
-                x, y = random.randint(0, self.grid_size[0] - 1), random.randint(0, self.grid_size[1] - 1)
-                if self.grid[x, y] == 0:  # Empty cell
-                    created_agent = Agent(prey_id, 'prey', (x, y))
-                    self.grid[x, y] = created_agent  # Prey
-                    self.agents.append(created_agent)
-                    break
+            cell = self._random_empty_cell()
+            if cell is None:
+                break
+            self._spawn(ROLE_PREY, *cell)
 
     def step(self, actions):
         """
@@ -244,8 +415,8 @@ class PredatorPreyEnv(ParallelEnv):
           4. Generation of new agents
           5. Observation update
         """
-        rewards = {agent.id: 0 for agent in self.agents}
-        dones = {agent.id: False for agent in self.agents}
+        rewards = {self.agent_id(i): 0 for i in self.agents}
+        dones = {self.agent_id(i): False for i in self.agents}
 
         self.agents_move(actions)
 
@@ -254,8 +425,18 @@ class PredatorPreyEnv(ParallelEnv):
         dones = self.predator_hunger(dones)
 
         self.generate_new_agents(0.003, 0.006)
+
+        # Only now may the rows freed by hunting/hunger be reused: ids in
+        # the returned dicts keep referring to the agents that died, not
+        # to newborns handed the same row
+        self.soa.flush_removed()
+
+        if not self.build_observations:
+            return None, rewards, dones
+
         # Update observations
-        observations = {agent.id: self.get_observation(agent) for agent in self.agents}
+        indices, obs_batch = self.get_all_observations()
+        observations = {self.agent_id(i): obs_batch[k] for k, i in enumerate(indices)}
 
         return observations, rewards, dones
 
@@ -265,11 +446,11 @@ class PredatorPreyEnv(ParallelEnv):
           - 'X' representing predator,
           - 'O' representing prey.
         """
-        render_grid = np.full(self.grid.shape, '.')
+        render_grid = np.full(self.grid_size, '.')
 
-        render_grid[self.grid == -1] = '#'  # Wall
-        render_grid[self.grid == 1] = 'O'  # Prey
-        render_grid[self.grid == 2] = 'X'  # Predator
+        render_grid[self.wall_mask] = '#'  # Wall
+        render_grid[self.grid_kind == KIND_PREY] = 'O'  # Prey
+        render_grid[self.grid_kind == KIND_PREDATOR] = 'X'  # Predator
 
         print("\n".join("".join(row) for row in render_grid))
-        print()
\ No newline at end of file
+        print()
@@ -2,9 +2,8 @@
 from pettingzoo.utils.env import ParallelEnv
 import numpy as np
 import random
-from agent import Agent
 import math
-from env_type1 import PredatorPreyEnv
+from env_type1 import PredatorPreyEnv, KIND_EMPTY, ROLE_PREDATOR, ROLE_PREY
 
 
 class PredatorPreyEnvType2(PredatorPreyEnv):
@@ -20,85 +19,76 @@ class PredatorPreyEnvType2(PredatorPreyEnv):
         self.predator_mating_probability = predator_mating_probability
         self.prey_mating_probability = prey_mating_probability
 
+        # Window offsets and Manhattan distances for the mating scope
+        self._mating_offs = np.arange(-mating_scope, mating_scope + 1)
+        self._mating_dist = np.abs(self._mating_offs)[:, None] + np.abs(self._mating_offs)[None, :]
+
     def mating(self, rewards, dones):
-        """Optimized mating function using mating_scope without unnecessary nesting."""
-        random.shuffle(self.agents)
-        available_positions = {(x, y) for x in range(self.grid_size[0]) for y in range(self.grid_size[1]) if
-                               self.grid[x, y] == 0}
+        """Mating of same-role agents found within mating_scope of each other."""
+        order = self.agents.tolist()
+        random.shuffle(order)
         paired_agents = set()
         frozen_agents = set()
-        agent_positions = {agent.get_position(): agent for agent in self.agents}
 
-        for agent in self.agents:
-            if agent in paired_agents or not available_positions:
+        for agent in order:
+            if agent in paired_agents:
                 continue
 
-            ax, ay = agent.get_position()
-            mating_range = range(-self.mating_scope, self.mating_scope + 1)
-            possible_mates = {(ax + dx, ay + dy) for dx in mating_range for dy in mating_range if (dx, dy) != (0, 0)}
-            possible_mates = {(x % self.grid_size[0], y % self.grid_size[1]) for x, y in possible_mates}
-            mates = [agent_positions[pos] for pos in possible_mates if
-                     pos in agent_positions and agent_positions[pos].role == agent.role and agent_positions[
-                         pos] not in paired_agents]
-
-            if mates:
-                closest_mate = min(mates, key=lambda m: abs(m.get_position()[0] - ax) + abs(m.get_position()[1] - ay))
-                mating_prob = self.predator_mating_probability if agent.role == 'predator' else self.prey_mating_probability
+            ax, ay = int(self.soa.pos_x[agent]), int(self.soa.pos_y[agent])
+            role = int(self.soa.role[agent])
+
+            xs = (ax + self._mating_offs) % self.grid_size[0]
+            ys = (ay + self._mating_offs) % self.grid_size[1]
+            patch_kind = self.grid_kind[np.ix_(xs, ys)]
+            patch_idx = self.grid_idx[np.ix_(xs, ys)]
+
+            # Closest same-role neighbour that is not already paired
+            closest_mate = None
+            closest_distance = None
+            for lx, ly in np.argwhere(patch_kind == role):
+                mate = int(patch_idx[lx, ly])
+                if mate == agent or mate in paired_agents:
+                    continue
+                distance = self._mating_dist[lx, ly]
+                if closest_distance is None or distance < closest_distance:
+                    closest_distance = distance
+                    closest_mate = mate
+
+            if closest_mate is not None:
+                mating_prob = self.predator_mating_probability if role == ROLE_PREDATOR else self.prey_mating_probability
                 if random.random() < mating_prob:
-                    rewards[agent.id] += self.mating_reward
-                    rewards[closest_mate.id] += self.mating_reward
+                    cell = self._random_empty_cell()
+                    if cell is None:
+                        # No room left for offspring; stop trying to mate
+                        break
+                    rewards[self.agent_id(agent)] += self.mating_reward
+                    rewards[self.agent_id(closest_mate)] += self.mating_reward
                     paired_agents.update([agent, closest_mate])
                     frozen_agents.update([agent, closest_mate])
 
-                    if available_positions:
-                        new_x, new_y = available_positions.pop()
-                        new_agent_id = f"{'pr' if agent.role == 'predator' else 'py'}_{len([a for a in self.agents if a.role == agent.role])}"
-                        new_agent = Agent(new_agent_id, agent.role, (new_x, new_y))
-                        self.agents.append(new_agent)
-                        self.grid[new_x, new_y] = new_agent
+                    new_agent = self._spawn(role, *cell)
+                    new_agent_id = self.agent_id(new_agent)
 
-                        rewards[new_agent_id] = 0
-                        dones[new_agent_id] = False
+                    rewards[new_agent_id] = 0
+                    dones[new_agent_id] = False
 
         return frozen_agents
 
     def ensure_population(self):
         """Ensure at least one predator and one prey are added each timestep."""
-        available_positions = [(x, y) for x in range(self.grid_size[0]) for y in range(self.grid_size[1]) if
-                               self.grid[x, y] == 0]
-
-        if not available_positions:
-            return
-
-        random.shuffle(available_positions)  # Ensures random placement of new agents
-
-        # Add at least one prey and one predator
-        for role in ['predator', 'prey']:
-            if len([a for a in self.agents if a.role == role]) < (
-            self.max_num_predators if role == 'predator' else self.max_num_preys):
-                if available_positions:  # Make sure there is available space
-                    new_x, new_y = available_positions.pop()
-                    new_agent_id = f"{'pr' if role == 'predator' else 'py'}_{len([a for a in self.agents if a.role == role])}"
-                    new_agent = Agent(new_agent_id, role, (new_x, new_y))
-                    self.agents.append(new_agent)
-                    self.grid[new_x, new_y] = new_agent
-
-    def predator_hunger(self, dones):
-        """Decrease predator health and remove dead predators."""
-        for predator in list(self.agents):
-            if "predator" in predator.role:
-                predator.add_health(-0.01)
-                if predator.health <= 0:
-                    px, py = predator.get_position()
-                    self.agents.remove(predator)
-                    self.grid[px, py] = 0
-                    dones[predator.id] = True
-
-        return dones
+        if self.count_predators() < self.max_num_predators:
+            cell = self._random_empty_cell()
+            if cell is not None:
+                self._spawn(ROLE_PREDATOR, *cell)
+        if self.count_preys() < self.max_num_preys:
+            cell = self._random_empty_cell()
+            if cell is not None:
+                self._spawn(ROLE_PREY, *cell)
+
     def step(self, actions):
         """Takes a step in the environment based on the actions and environment rules."""
-        rewards = {agent.id: 0 for agent in self.agents}
-        dones = {agent.id: False for agent in self.agents}
+        rewards = {self.agent_id(i): 0 for i in self.agents}
+        dones = {self.agent_id(i): False for i in self.agents}
 
         self.agents_move(actions)
 
@@ -110,8 +100,14 @@ class PredatorPreyEnvType2(PredatorPreyEnv):
 
         self.ensure_population()
 
+        # Only now may the rows freed by hunting/hunger be reused: ids in
+        # the returned dicts keep referring to the agents that died, not
+        # to newborns handed the same row
+        self.soa.flush_removed()
+
         # Update observations
-        observations = {agent.id: self.get_observation(agent) for agent in self.agents}
+        indices, obs_batch = self.get_all_observations()
+        observations = {self.agent_id(i): obs_batch[k] for k, i in enumerate(indices)}
 
         return observations, rewards, dones
 
@@ -2,7 +2,7 @@ import random
 import numpy as np
 import math
 from pettingzoo.utils.env import ParallelEnv
-from agent_type3 import AgentType3
+from agent_type3 import AgentType3, ROLE_PREDATOR, ROLE_PREY
 
 # ------------------------------
 # Environment 3 – Unique genetic features for each agent
@@ -79,7 +79,7 @@ class PredatorPreyEnvType3(ParallelEnv):
                 x = random.randint(0, self.grid_size[0] - 1)
                 y = random.randint(0, self.grid_size[1] - 1)
                 if self.grid[x, y] == 0:
-                    predator = AgentType3(f"pr_{i}", "predator", (x, y))
+                    predator = AgentType3(f"pr_{i}", ROLE_PREDATOR, (x, y))
                     self.agents.append(predator)
                     self.grid[x, y] = predator
                     break
@@ -90,7 +90,7 @@ class PredatorPreyEnvType3(ParallelEnv):
                 x = random.randint(0, self.grid_size[0] - 1)
                 y = random.randint(0, self.grid_size[1] - 1)
                 if self.grid[x, y] == 0:
-                    prey = AgentType3(f"py_{i}", "prey", (x, y))
+                    prey = AgentType3(f"py_{i}", ROLE_PREY, (x, y))
                     self.agents.append(prey)
                     self.grid[x, y] = prey
                     break
@@ -163,12 +163,12 @@ class PredatorPreyEnvType3(ParallelEnv):
                     wall_layer[local_x, local_y] = 1
                 elif isinstance(self.grid[nx, ny], AgentType3):
                     other = self.grid[nx, ny]
-                    if other.role == 'predator':
+                    if other.role == ROLE_PREDATOR:
                         predator_layer[local_x, local_y] = 1
                         health_layer[local_x, local_y] = other.health
                         attack_layer[local_x, local_y] = other.attack
                         speed_layer[local_x, local_y] = other.speed
-                    elif other.role == 'prey':
+                    elif other.role == ROLE_PREY:
                         prey_layer[local_x, local_y] = 1
                         health_layer[local_x, local_y] = other.health
                         resilience_layer[local_x, local_y] = other.resilience
@@ -190,7 +190,7 @@ class PredatorPreyEnvType3(ParallelEnv):
         provided that the sum of their attack reduces the prey's resilience to 0 or below.
         """
         prey_attacks = {}
-        for predator in [a for a in self.agents if a.role == 'predator']:
+        for predator in [a for a in self.agents if a.role == ROLE_PREDATOR]:
             px, py = predator.get_position()
             closest_prey = None
             min_distance = float('inf')
@@ -202,7 +202,7 @@ class PredatorPreyEnvType3(ParallelEnv):
                     ny = (py + dy) % self.grid_size[1]
                     if isinstance(self.grid[nx, ny], AgentType3):
                         other = self.grid[nx, ny]
-                        if other.role == 'prey':
+                        if other.role == ROLE_PREY:
                             distance = abs(dx) + abs(dy)
                             if distance < min_distance:
                                 min_distance = distance
@@ -228,7 +228,7 @@ class PredatorPreyEnvType3(ParallelEnv):
 
     def predator_hunger(self, dones):
         """Decrease predator health and remove dead predators"""
-        for predator in list(a for a in self.agents if a.role == 'predator'):
+        for predator in list(a for a in self.agents if a.role == ROLE_PREDATOR):
             predator.add_health(-self.health_penalty)
             if predator.health <= 0:
                 x, y = predator.get_position()
@@ -249,7 +249,7 @@ class PredatorPreyEnvType3(ParallelEnv):
         selected parents.
         """
         # Calculate the number of new predators and prey
-        predators = [a for a in self.agents if a.role == 'predator']
+        predators = [a for a in self.agents if a.role == ROLE_PREDATOR]
         num_predators = len(predators)
         new_predators = 0
         if num_predators < self.max_num_predators:
@@ -273,13 +273,13 @@ class PredatorPreyEnvType3(ParallelEnv):
                 new_speed = random.uniform(0.5, 1.5)
                 new_attack = random.uniform(0.5, 1.5)
 
-            predator_id = f"pr_{len([a for a in self.agents if a.role == 'predator'])}"
+            predator_id = f"pr_{len([a for a in self.agents if a.role == ROLE_PREDATOR])}"
             #
             # We search for a random, free position on the grid.
             while True:
                 x, y = random.randint(0, self.grid_size[0] - 1), random.randint(0, self.grid_size[1] - 1)
                 if self.grid[x, y] == 0:
-                    new_pred = AgentType3(predator_id, 'predator', (x, y))
+                    new_pred = AgentType3(predator_id, ROLE_PREDATOR, (x, y))
                     new_pred.health = random.uniform(0.5, 1)
                     new_pred.speed = new_speed
                     new_pred.attack = new_attack
@@ -289,7 +289,7 @@ class PredatorPreyEnvType3(ParallelEnv):
                     break
 
         # --- Generating new preys ---
-        preys = [a for a in self.agents if a.role == 'prey']
+        preys = [a for a in self.agents if a.role == ROLE_PREY]
         num_preys = len(preys)
         new_preys = 0
         if num_preys < self.max_num_preys:
@@ -309,11 +309,11 @@ class PredatorPreyEnvType3(ParallelEnv):
                 new_speed = random.uniform(0.5, 1.5)
                 new_resilience = random.uniform(0.5, 1.5)
 
-            prey_id = f"py_{len([a for a in self.agents if a.role == 'prey'])}"
+            prey_id = f"py_{len([a for a in self.agents if a.role == ROLE_PREY])}"
             while True:
                 x, y = random.randint(0, self.grid_size[0] - 1), random.randint(0, self.grid_size[1] - 1)
                 if self.grid[x, y] == 0:
-                    new_prey = AgentType3(prey_id, 'prey', (x, y))
+                    new_prey = AgentType3(prey_id, ROLE_PREY, (x, y))
                     new_prey.health = 1
                     new_prey.speed = new_speed
                     new_prey.resilience = new_resilience
@@ -349,15 +349,11 @@ class PredatorPreyEnvType3(ParallelEnv):
           - 'O' representing prey.
         """
         render_grid = np.full(self.grid.shape, '.')
-        for i in range(self.grid_size[0]):
-            for j in range(self.grid_size[1]):
-                if self.grid[i, j] == -1:
-                    render_grid[i, j] = '#'
-                elif isinstance(self.grid[i, j], AgentType3):
-                    if self.grid[i, j].role == 'predator':
-                        render_grid[i, j] = 'X'
-                    elif self.grid[i, j].role == 'prey':
-                        render_grid[i, j] = 'O'
-        for row in render_grid:
-            print("".join(row))
+        # Only walls and agents need marking - no reason to scan every cell
+        for wx, wy in self.walls_positions:
+            render_grid[wx, wy] = '#'
+        for agent in self.agents:
+            x, y = agent.get_position()
+            render_grid[x, y] = 'X' if agent.role == ROLE_PREDATOR else 'O'
+        print("\n".join("".join(row) for row in render_grid))
         print()
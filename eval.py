@@ -1,3 +1,4 @@
+import atexit
 import sys
 import unittest
 from collections import deque
@@ -6,7 +7,7 @@ import csv
 import torch
 import torch.optim as optim
 
-from model import DDQNLSTM
+from model import DDQNLSTM, maybe_compile
 from env_type1 import PredatorPreyEnv
 
 def env_creator():
@@ -32,55 +33,65 @@ if __name__ == "__main__":
 
     csv_file = 'Eval_output_ENV_1_more_hunger_ceil_more_reward_bigger_observation.csv'
     data = []
+    # Open the results file once; rows are flushed each iteration and the
+    # handle is closed on interpreter exit even if the run crashes
+    csv_handle = open(csv_file, mode='a', newline='')
+    csv_writer = csv.writer(csv_handle)
+    atexit.register(csv_handle.close)
 
     predator_replay_buffer = deque()
     prey_replay_buffer = deque()
 
     # Models
-    predator_policy_model = DDQNLSTM((4, 51, 51), 4).to(device)
-    prey_policy_model = DDQNLSTM((4, 51, 51), 4).to(device)
+    predator_policy_model = DDQNLSTM((4, 11, 11), 4).to(device)
+    prey_policy_model = DDQNLSTM((4, 11, 11), 4).to(device)
 
     predator_policy_model.load_state_dict(torch.load('predator_policy_model.pth'))
     predator_policy_model.eval()
+    predator_policy_model = maybe_compile(predator_policy_model)
 
     prey_policy_model.load_state_dict(torch.load('prey_policy_model.pth'))
     prey_policy_model.eval()
+    prey_policy_model = maybe_compile(prey_policy_model)
 
     # Optimizers
     predator_optimizer = optim.Adam(predator_policy_model.parameters(), lr=LEARNING_RATE)
     prey_optimizer = optim.Adam(prey_policy_model.parameters(), lr=LEARNING_RATE)
 
-    hidden_states = {agent.id: None for agent in env.agents}
-    new_hidden_states = {agent.id: None for agent in env.agents}
+    hidden_states = {env.agent_id(i): None for i in env.agents}
+    new_hidden_states = {env.agent_id(i): None for i in env.agents}
 
     for i in range(20000):
         actions = {}
-        for agent in env.agents:
-            obs_tensor = torch.tensor(obs[agent.id], dtype=torch.float32).unsqueeze(0).to(device)
-            if agent.id not in hidden_states.keys():
+        for agent_id in obs.keys():
+            obs_tensor = torch.tensor(obs[agent_id], dtype=torch.float32).unsqueeze(0).to(device)
+            if agent_id not in hidden_states.keys():
                 hidden_state = None
-                hidden_states[agent.id] = None
+                hidden_states[agent_id] = None
             else:
-                hidden_state = hidden_states[agent.id]
-            if agent.role == 'predator':
+                hidden_state = hidden_states[agent_id]
+            if agent_id.startswith('pr'):
                 action_values, new_hidden_state = predator_policy_model(obs_tensor, hidden_state)
             else:
                 action_values, new_hidden_state = prey_policy_model(obs_tensor, hidden_state)
 
-            actions[agent.id] = torch.argmax(action_values)
-            new_hidden_states[agent.id] = new_hidden_state
+            actions[agent_id] = torch.argmax(action_values)
+            new_hidden_states[agent_id] = new_hidden_state
 
         new_obs, rewards, dones = env.step(actions)
 
-        num_predators = len([a for a in env.agents if "predator" in a.role])
-        num_preys = len([a for a in env.agents if "prey" in a.role])
+        num_predators = env.count_predators()
+        num_preys = env.count_preys()
         data.append([i, num_predators, num_preys])
 
         obs = new_obs
-        hidden_state = new_hidden_states
+        # Hand over the fresh LSTM states and start a new dict; the old
+        # code assigned them to a dead variable, so the states never
+        # advanced between steps
+        hidden_states = new_hidden_states
+        new_hidden_states = {}
         print(i, num_predators, num_preys)
-        with open(csv_file, mode='a', newline='') as file:  # Open in append mode
-            writer = csv.writer(file)
-            writer.writerow([i, num_predators, num_preys])
-
+        csv_writer.writerow([i, num_predators, num_preys])
+        csv_handle.flush()
 
+    csv_handle.close()
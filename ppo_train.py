@@ -1,3 +1,4 @@
+import atexit
 import sys
 import unittest
 from collections import deque
@@ -150,41 +151,46 @@ if __name__ == "__main__":
 
     csv_file = 'output_ENV_1_PPO.csv'
     data = []
+    # Open the results file once; rows are flushed each iteration and the
+    # handle is closed on interpreter exit even if the run crashes
+    csv_handle = open(csv_file, mode='a', newline='')
+    csv_writer = csv.writer(csv_handle)
+    atexit.register(csv_handle.close)
 
     predator_replay_buffer = deque()
     prey_replay_buffer = deque()
 
     # Models
-    predator_policy_model = ActorCriticModel((4, 51, 51), 4).to(device)
-    prey_policy_model = ActorCriticModel((4, 51, 51), 4).to(device)
+    predator_policy_model = ActorCriticModel((4, 11, 11), 4).to(device)
+    prey_policy_model = ActorCriticModel((4, 11, 11), 4).to(device)
 
     # Optimizers
     predator_optimizer = optim.Adam(predator_policy_model.parameters(), lr=LEARNING_RATE)
     prey_optimizer = optim.Adam(prey_policy_model.parameters(), lr=LEARNING_RATE)
 
-    hidden_states = {agent.id: None for agent in env.agents}
-    new_hidden_states = {agent.id: None for agent in env.agents}
+    hidden_states = {env.agent_id(i): None for i in env.agents}
+    new_hidden_states = {env.agent_id(i): None for i in env.agents}
 
     for i in range(20000):
         actions = {}
-        # actions = {agent.id: random.randint(0, 4) for agent in env.agents}
-        for agent in env.agents:
-            obs_tensor = torch.tensor(obs[agent.id], dtype=torch.float32).unsqueeze(0).to(device)
-            if agent.id not in hidden_states.keys():
+        # actions = {agent_id: random.randint(0, 4) for agent_id in obs.keys()}
+        for agent_id in obs.keys():
+            obs_tensor = torch.tensor(obs[agent_id], dtype=torch.float32).unsqueeze(0).to(device)
+            if agent_id not in hidden_states.keys():
                 hidden_state = None
-                hidden_states[agent.id] = None
+                hidden_states[agent_id] = None
             else:
-                hidden_state = hidden_states[agent.id]
-            if agent.role == 'predator':
+                hidden_state = hidden_states[agent_id]
+            if agent_id.startswith('pr'):
                 action_values, _, new_hidden_state = predator_policy_model(obs_tensor, hidden_state)
             else:
                 action_values, _, new_hidden_state = prey_policy_model(obs_tensor, hidden_state)
 
             if random.random() < EPSILON:  # Exploration
-                actions[agent.id] = torch.tensor(random.randint(0, 3), device=device)  # Assuming action space is [0, 1, 2, 3]
+                actions[agent_id] = torch.tensor(random.randint(0, 3), device=device)  # Assuming action space is [0, 1, 2, 3]
             else:  # Exploitation
-                actions[agent.id] = torch.argmax(action_values)
-            new_hidden_states[agent.id] = new_hidden_state
+                actions[agent_id] = torch.argmax(action_values)
+            new_hidden_states[agent_id] = new_hidden_state
 
         new_obs, rewards, dones = env.step(actions)
 
@@ -215,16 +221,16 @@ if __name__ == "__main__":
             update_weights_ppo(prey_replay_buffer, prey_policy_model, prey_optimizer, device)
 
 
-        num_predators = len([a for a in env.agents if "predator" in a.role])
-        num_preys = len([a for a in env.agents if "prey" in a.role])
+        num_predators = env.count_predators()
+        num_preys = env.count_preys()
         data.append([i, num_predators, num_preys])
 
         obs = new_obs
         hidden_state = new_hidden_states
         print(i, num_predators, num_preys)
-        with open(csv_file, mode='a', newline='') as file:  # Open in append mode
-            writer = csv.writer(file)
-            writer.writerow([i, num_predators, num_preys])
+        csv_writer.writerow([i, num_predators, num_preys])
+        csv_handle.flush()
+    csv_handle.close()
     torch.save(predator_policy_model.state_dict(), "ppo_predator_policy_model.pth")
 
     torch.save(prey_policy_model.state_dict(), "ppo_prey_policy_model.pth")
@@ -1,57 +1,101 @@
+import atexit
 import csv
-import random
 import sys
 import unittest
-from collections import deque
+from dataclasses import dataclass
 
 import torch
 from torch import optim
 
 from env_type1 import PredatorPreyEnv
-from model import DDQNLSTM
-
-
-def batchify(data, batch_size):
-    return [data[i:i + batch_size] for i in range(0, len(data), batch_size)]
-
-
-def update_weights(agent_replay_buffer, agent_policy_model, agent_target_model, agent_optimizer, device='cpu'):
-    batch = random.sample(agent_replay_buffer, BUFFER_SIZE)
-
-    mini_batches = batchify(batch, BATCH_SIZE)
-    for minibatch in mini_batches:
-        # Compute target Q-values and optimize
-        q_values_batch = []
-        target_q_values = []
-        for obs_mn, action_mn, reward_mn, done_mn, next_obs_mn, hidden_state_mn, next_hidden_state_mn in minibatch:
-            with torch.no_grad():
-                next_obs = torch.tensor(next_obs_mn, dtype=torch.float32).unsqueeze(0).to(device)
-                next_action = torch.argmax(agent_policy_model(next_obs, next_hidden_state_mn)[0])
-                target_q_value = reward_mn + GAMMA * (1 - done_mn) * \
-                                 agent_target_model(next_obs, next_hidden_state_mn)[0].squeeze(0)[next_action]
-                target_q_values.append(target_q_value)
-            q_values, _ = agent_policy_model(torch.tensor(obs_mn, dtype=torch.float32, device=device).unsqueeze(0), hidden_state_mn)
-            q_value = q_values.gather(1, action_mn.view(1, 1)).squeeze()
-            q_values_batch.append(q_value)
-        target_q_values = torch.stack(target_q_values)
-
-        q_values_batch = torch.stack((q_values_batch))
-        loss = torch.nn.functional.mse_loss(q_values_batch, target_q_values)
-
-        # Optimize the shared network
-        agent_optimizer.zero_grad()
-        loss.backward()
-        torch.nn.utils.clip_grad_norm_(agent_policy_model.parameters(), 1.0)
-        agent_optimizer.step()
-
-    if i % UPDATE_FREQ == 0:
-        agent_target_model.load_state_dict(agent_policy_model.state_dict())
-        torch.save(predator_target_model.state_dict(), "models/predator_target_model.pth")
-        torch.save(predator_policy_model.state_dict(), "models/predator_policy_model.pth")
-
-        torch.save(prey_target_model.state_dict(), "models/prey_target_model.pth")
-        torch.save(prey_policy_model.state_dict(), "models/prey_policy_model.pth")
-    agent_replay_buffer.clear()
+from model import DDQNLSTM, GraphedInference, maybe_compile
+from obs_gather import DeviceObsGather
+from replay_buffer import ReplayBuffer
+
+
+@dataclass(frozen=True)
+class TrainCfg:
+    """Training hyperparameters, passed explicitly instead of read as
+    globals inside update_weights."""
+    buffer_size: int = 10000
+    batch_size: int = 64
+    epsilon: float = 0.1
+    train_every: int = 4
+    update_freq: int = 50
+    gamma: float = 0.99
+    learning_rate: float = 0.0001
+
+
+def stack_hidden(hiddens, hidden_size, device):
+    """Packs per-agent (h, c) LSTM states (or None) into one (1, N, hidden)
+    pair; missing states become zeros."""
+    h = torch.zeros(1, len(hiddens), hidden_size, device=device)
+    c = torch.zeros(1, len(hiddens), hidden_size, device=device)
+    for k, hidden in enumerate(hiddens):
+        if hidden is not None:
+            h[:, k] = hidden[0][:, 0]
+            c[:, k] = hidden[1][:, 0]
+    return h, c
+
+
+def select_actions(agent_ids, obs_list, rollout, hidden_states, new_hidden_states):
+    """Epsilon-greedy action selection for one role, batched through the
+    rollout runner (a replayed CUDA graph on GPU, a plain no_grad forward
+    on CPU) instead of one model call per agent."""
+    obs_batch = torch.stack(obs_list)  # observations already live on device
+    hidden_batch = stack_hidden([hidden_states.get(agent_id) for agent_id in agent_ids],
+                                rollout.hidden_size, device)
+
+    action_values, (h1, c1) = rollout(obs_batch, hidden_batch)
+    greedy_actions = torch.argmax(action_values, dim=1)
+
+    # Vectorized epsilon-greedy: one uniform draw and one randint draw for
+    # the whole batch instead of N Python-random calls and N tiny copies
+    explore = torch.rand(len(agent_ids), device=device) < EPSILON
+    random_actions = torch.randint(0, 4, (len(agent_ids),), device=device)
+    # One device-to-host transfer for the whole batch; handing out 0-dim
+    # device tensors would cost the env a sync per agent when it reads them
+    chosen_actions = torch.where(explore, random_actions, greedy_actions).cpu().tolist()
+
+    actions = {}
+    for k, agent_id in enumerate(agent_ids):
+        actions[agent_id] = chosen_actions[k]
+        new_hidden_states[agent_id] = (h1[:, k:k + 1].contiguous(), c1[:, k:k + 1].contiguous())
+    return actions
+
+
+def update_weights(cfg, agent_replay_buffer, agent_policy_model, agent_target_model, agent_optimizer):
+    obs_batch, action_batch, reward_batch, done_batch, next_obs_batch, hidden_batch, next_hidden_batch = \
+        agent_replay_buffer.sample(cfg.batch_size)
+
+    # Double DQN target: the policy net picks the next action, the
+    # target net scores it - one forward pass per model for the batch
+    with torch.no_grad():
+        next_q_policy, _ = agent_policy_model(next_obs_batch, next_hidden_batch)
+        next_actions = torch.argmax(next_q_policy, dim=1, keepdim=True)
+        next_q_target, _ = agent_target_model(next_obs_batch, next_hidden_batch)
+        target_q_values = reward_batch + cfg.gamma * (1 - done_batch) * \
+                          next_q_target.gather(1, next_actions).squeeze(1)
+
+    q_values, _ = agent_policy_model(obs_batch, hidden_batch)
+    q_values_batch = q_values.gather(1, action_batch.view(-1, 1)).squeeze(1)
+
+    loss = torch.nn.functional.mse_loss(q_values_batch, target_q_values)
+
+    # Optimize the shared network
+    agent_optimizer.zero_grad()
+    loss.backward()
+    torch.nn.utils.clip_grad_norm_(agent_policy_model.parameters(), 1.0)
+    agent_optimizer.step()
+
+
+def gather_observations(env, device_obs):
+    """Builds the id -> observation dict for every living agent with the
+    device-side gather instead of env-built NumPy batches."""
+    device_obs.refresh()
+    rows = env.agents
+    batch = device_obs.gather(rows)
+    return {env.agent_id(j): batch[k] for k, j in enumerate(rows)}
 # Wrapping the environment - Can be added in the future
 
 def env_creator():
@@ -84,96 +128,120 @@ if __name__ == "__main__":
         print("WARNING: running without tests...")    
 
     # Hyperparameters
-    BUFFER_SIZE = 64
-    BATCH_SIZE = 64
-    EPSILON = 0.1
-    UPDATE_FREQ = 50
-    GAMMA = 0.99
-    LEARNING_RATE = 0.0001
+    cfg = TrainCfg()
+    EPSILON = cfg.epsilon
 
     env = env_creator()
-    obs = env.reset()
+    env.reset()
     # env.render()
 
+    # Observations come from the device-side gather; the grid layers are
+    # the only per-step host-to-device traffic
+    device_obs = DeviceObsGather(env, device)
+    env.build_observations = False
+    obs = gather_observations(env, device_obs)
+
     csv_file = 'Eval_output_ENV_1_more_hunger_ceil_more_reward_bigger_observation.csv'
     data = []
-
-    predator_replay_buffer = deque()
-    prey_replay_buffer = deque()
+    # Open the results file once; rows are flushed each iteration and the
+    # handle is closed on interpreter exit even if the run crashes
+    csv_handle = open(csv_file, mode='a', newline='')
+    csv_writer = csv.writer(csv_handle)
+    atexit.register(csv_handle.close)
 
     # Models
-    predator_policy_model = DDQNLSTM((4, 51, 51), 4).to(device)
-    predator_target_model = DDQNLSTM((4, 51, 51), 4).to(device)
-    prey_policy_model = DDQNLSTM((4, 51, 51), 4).to(device)
-    prey_target_model = DDQNLSTM((4, 51, 51), 4).to(device)
+    predator_policy_model = maybe_compile(DDQNLSTM((4, 11, 11), 4).to(device))
+    predator_target_model = maybe_compile(DDQNLSTM((4, 11, 11), 4).to(device))
+    prey_policy_model = maybe_compile(DDQNLSTM((4, 11, 11), 4).to(device))
+    prey_target_model = maybe_compile(DDQNLSTM((4, 11, 11), 4).to(device))
+
+    # Replay buffers (preallocated tensor rings)
+    hidden_size = predator_policy_model.lstm.hidden_size
+
+    # Rollout inference runners; on GPU the fixed-shape forward is captured
+    # into a CUDA graph and replayed every step
+    predator_rollout = GraphedInference(predator_policy_model, (4, 11, 11), hidden_size, device)
+    prey_rollout = GraphedInference(prey_policy_model, (4, 11, 11), hidden_size, device)
+    predator_replay_buffer = ReplayBuffer(cfg.buffer_size, (4, 11, 11), hidden_size, device)
+    prey_replay_buffer = ReplayBuffer(cfg.buffer_size, (4, 11, 11), hidden_size, device)
 
     # Optimizers
-    predator_optimizer = optim.Adam(predator_policy_model.parameters(), lr=LEARNING_RATE)
-    prey_optimizer = optim.Adam(prey_policy_model.parameters(), lr=LEARNING_RATE)
+    predator_optimizer = optim.Adam(predator_policy_model.parameters(), lr=cfg.learning_rate)
+    prey_optimizer = optim.Adam(prey_policy_model.parameters(), lr=cfg.learning_rate)
 
-    hidden_states = {agent.id: None for agent in env.agents}
-    new_hidden_states = {agent.id: None for agent in env.agents}
+    hidden_states = {env.agent_id(i): None for i in env.agents}
+    new_hidden_states = {env.agent_id(i): None for i in env.agents}
 
     for i in range(20000):
         actions = {}
-        # actions = {agent.id: random.randint(0, 4) for agent in env.agents}
-        for agent in env.agents:
-            obs_tensor = torch.tensor(obs[agent.id], dtype=torch.float32).unsqueeze(0).to(device)
-            if agent.id not in hidden_states.keys():
-                hidden_state = None
-                hidden_states[agent.id] = None
-            else:
-                hidden_state = hidden_states[agent.id]
-            if agent.role == 'predator':
-                action_values, new_hidden_state = predator_policy_model(obs_tensor, hidden_state)
-            else:
-                action_values, new_hidden_state = prey_policy_model(obs_tensor, hidden_state)
-
-            if random.random() < EPSILON:  # Exploration
-                actions[agent.id] = torch.tensor(random.randint(0, 3), device=device)  # Assuming action space is [0, 1, 2, 3]
-            else:  # Exploitation
-                actions[agent.id] = torch.argmax(action_values)
-            new_hidden_states[agent.id] = new_hidden_state
-
-        new_obs, rewards, dones = env.step(actions)
+        predator_ids = [agent_id for agent_id in obs.keys() if agent_id.startswith('pr')]
+        prey_ids = [agent_id for agent_id in obs.keys() if agent_id.startswith('py')]
+        if predator_ids:
+            actions.update(select_actions(predator_ids, [obs[a] for a in predator_ids],
+                                          predator_rollout, hidden_states, new_hidden_states))
+        if prey_ids:
+            actions.update(select_actions(prey_ids, [obs[a] for a in prey_ids],
+                                          prey_rollout, hidden_states, new_hidden_states))
+
+        _, rewards, dones = env.step(actions)
+        new_obs = gather_observations(env, device_obs)
 
         for agent_id in actions.keys():
+            obs_to_save = obs[agent_id]
             if dones[agent_id]:
-                new_obs_to_save = torch.zeros_like(torch.tensor(obs[agent_id], dtype=torch.float32)).to(device)  # Placeholder
+                new_obs_to_save = torch.zeros_like(obs_to_save)  # Placeholder
             else:
                 new_obs_to_save = new_obs[agent_id]
             experience = (
-                obs[agent_id],  # Current observation
+                obs_to_save,  # Current observation
                 actions[agent_id],  # Action taken
                 rewards[agent_id],  # Reward received
                 dones[agent_id],  # Done flag
                 new_obs_to_save,  # Next observation
-                hidden_states[agent_id],  # Current hidden state
+                hidden_states.get(agent_id),  # Current hidden state
                 new_hidden_states[agent_id]
             )
             if agent_id[:2] == 'pr':
-                predator_replay_buffer.append(experience)
+                predator_replay_buffer.append(*experience)
             else:
-                prey_replay_buffer.append(experience)
+                prey_replay_buffer.append(*experience)
+
+        # The buffers persist between updates (the ring overwrites the
+        # oldest rows), so training runs every train_every steps on a
+        # sample of the accumulated experience
+        if i % cfg.train_every == 0:
+            if len(predator_replay_buffer) >= cfg.batch_size:
+                update_weights(cfg, predator_replay_buffer, predator_policy_model, predator_target_model, predator_optimizer)
+            if len(prey_replay_buffer) >= cfg.batch_size:
+                update_weights(cfg, prey_replay_buffer, prey_policy_model, prey_target_model, prey_optimizer)
+
+        # Target sync follows the step counter, independent of how often
+        # training itself runs
+        if i % cfg.update_freq == 0:
+            predator_target_model.load_state_dict(predator_policy_model.state_dict())
+            prey_target_model.load_state_dict(prey_policy_model.state_dict())
+
+            torch.save(predator_target_model.state_dict(), "models/predator_target_model.pth")
+            torch.save(predator_policy_model.state_dict(), "models/predator_policy_model.pth")
 
-        if len(predator_replay_buffer) >= BUFFER_SIZE:
-            # Sample a minibatch and train (same as before)
-            update_weights(predator_replay_buffer, predator_policy_model, predator_target_model, predator_optimizer, device)
-        if len(prey_replay_buffer) >= BUFFER_SIZE:
-            # Sample a minibatch and train (same as before)
-            update_weights(prey_replay_buffer, prey_policy_model, prey_target_model, prey_optimizer, device)
+            torch.save(prey_target_model.state_dict(), "models/prey_target_model.pth")
+            torch.save(prey_policy_model.state_dict(), "models/prey_policy_model.pth")
 
 
-        num_predators = len([a for a in env.agents if "predator" in a.role])
-        num_preys = len([a for a in env.agents if "prey" in a.role])
+        num_predators = env.count_predators()
+        num_preys = env.count_preys()
         data.append([i, num_predators, num_preys])
 
         obs = new_obs
-        hidden_state = new_hidden_states
+        # Hand over the fresh LSTM states and start a new dict, so the
+        # states saved with the next step's experiences are the pre-step
+        # ones (the old code never reassigned hidden_states at all)
+        hidden_states = new_hidden_states
+        new_hidden_states = {}
         print(i, num_predators, num_preys)
-        with open(csv_file, mode='a', newline='') as file:  # Open in append mode
-            writer = csv.writer(file)
-            writer.writerow([i, num_predators, num_preys])
+        csv_writer.writerow([i, num_predators, num_preys])
+        csv_handle.flush()
+    csv_handle.close()
     torch.save(predator_target_model.state_dict(), "predator_target_model.pth")
     torch.save(predator_policy_model.state_dict(), "predator_policy_model.pth")
 
@@ -1,3 +1,4 @@
+import atexit
 import torch
 import torch.optim as optim
 import csv
@@ -5,7 +6,7 @@ import random
 import matplotlib.pyplot as plt
 from collections import deque
 from env_type2 import PredatorPreyEnvType2
-from model import DDQNLSTM
+from model import DDQNLSTM, maybe_compile
 
 
 # Function to update weights
@@ -55,23 +56,28 @@ obs = env.reset()
 # File to store results
 csv_file = 'output_ENV_2.csv'
 data = []
+# Open the results file once; rows are flushed each iteration and the
+# handle is closed on interpreter exit even if the run crashes
+csv_handle = open(csv_file, mode='a', newline='')
+csv_writer = csv.writer(csv_handle)
+atexit.register(csv_handle.close)
 
 # Replay buffers
 predator_replay_buffer = deque()
 prey_replay_buffer = deque()
 
 # Models
-predator_policy_model = DDQNLSTM((4, 11, 11), 4).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-predator_target_model = DDQNLSTM((4, 11, 11), 4).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-prey_policy_model = DDQNLSTM((4, 11, 11), 4).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-prey_target_model = DDQNLSTM((4, 11, 11), 4).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
+predator_policy_model = maybe_compile(DDQNLSTM((4, 11, 11), 4).to(torch.device("cuda" if torch.cuda.is_available() else "cpu")))
+predator_target_model = maybe_compile(DDQNLSTM((4, 11, 11), 4).to(torch.device("cuda" if torch.cuda.is_available() else "cpu")))
+prey_policy_model = maybe_compile(DDQNLSTM((4, 11, 11), 4).to(torch.device("cuda" if torch.cuda.is_available() else "cpu")))
+prey_target_model = maybe_compile(DDQNLSTM((4, 11, 11), 4).to(torch.device("cuda" if torch.cuda.is_available() else "cpu")))
 
 # Optimizers
 predator_optimizer = optim.Adam(predator_policy_model.parameters(), lr=LEARNING_RATE)
 prey_optimizer = optim.Adam(prey_policy_model.parameters(), lr=LEARNING_RATE)
 
-hidden_states = {agent.id: None for agent in env.agents}
-new_hidden_states = {agent.id: None for agent in env.agents}
+hidden_states = {env.agent_id(i): None for i in env.agents}
+new_hidden_states = {env.agent_id(i): None for i in env.agents}
 
 epochs = []
 predator_counts = []
@@ -83,36 +89,36 @@ for i in range(EPOCHS):
     # env.ensure_population()
     print(f"Iteration {i}")
 
-    for agent in env.agents:
-        if agent in frozen_agents:
+    for agent_id in obs.keys():
+        if agent_id in frozen_agents:
             continue
 
-        # obs_tensor = torch.tensor(obs[agent.id], dtype=torch.float32).unsqueeze(0)
-        # hidden_state = hidden_states.get(agent.id, None)
+        # obs_tensor = torch.tensor(obs[agent_id], dtype=torch.float32).unsqueeze(0)
+        # hidden_state = hidden_states.get(agent_id, None)
 
         if USE_RANDOM_ACTIONS:
-            actions[agent.id] = random.randint(0, 3)
+            actions[agent_id] = random.randint(0, 3)
             new_hidden_state = None
         else:
-            obs_tensor = torch.tensor(obs[agent.id], dtype=torch.float32).unsqueeze(0)
-            hidden_state = hidden_states.get(agent.id, None)
-            if agent.role == 'predator':
+            obs_tensor = torch.tensor(obs[agent_id], dtype=torch.float32).unsqueeze(0)
+            hidden_state = hidden_states.get(agent_id, None)
+            if agent_id.startswith('pr'):
                 action_values, new_hidden_state = predator_policy_model(obs_tensor, hidden_state)
             else:
                 action_values, new_hidden_state = prey_policy_model(obs_tensor, hidden_state)
 
             if random.random() < EPSILON:
-                actions[agent.id] = random.randint(0, 3)
+                actions[agent_id] = random.randint(0, 3)
             else:
-                actions[agent.id] = torch.argmax(action_values).item()
+                actions[agent_id] = torch.argmax(action_values).item()
 
-        new_hidden_states[agent.id] = new_hidden_state
+        new_hidden_states[agent_id] = new_hidden_state
 
     new_obs, rewards, dones = env.step(actions)
     num_matings = rewards.get('mating_count', 0)
 
-    num_predators = len([a for a in env.agents if a.role == "predator"])
-    num_preys = len([a for a in env.agents if a.role == "prey"])
+    num_predators = env.count_predators()
+    num_preys = env.count_preys()
     print(f"Predators: {num_predators}, Preys: {num_preys}")
 
     epochs.append(i)
@@ -154,9 +160,10 @@ for i in range(EPOCHS):
     obs = new_obs
     hidden_states = new_hidden_states
 
-    with open(csv_file, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([i, num_predators, num_preys])
+    csv_writer.writerow([i, num_predators, num_preys])
+    csv_handle.flush()
+
+csv_handle.close()
 
 plt.figure(figsize=(10, 5))
 plt.plot(epochs, predator_counts, label='Predators')
@@ -1,7 +1,9 @@
+import atexit
 import math
 import sys
 import unittest
 from collections import deque
+from dataclasses import dataclass
 
 from pettingzoo.utils.env import ParallelEnv
 from pettingzoo.utils import wrappers
@@ -12,35 +14,69 @@ import torch
 import torch.optim as optim
 
 from agent import Agent
-from model import DDQNLSTM
+from model import DDQNLSTM, maybe_compile
 
+from agent_type3 import ROLE_PREDATOR, ROLE_PREY
 from env_type3 import PredatorPreyEnvType3
 
+@dataclass(frozen=True)
+class TrainCfg:
+    """Training hyperparameters, passed explicitly instead of read as
+    globals inside update_weights."""
+    buffer_size: int = 10000
+    batch_size: int = 64
+    epsilon: float = 0.1
+    train_every: int = 4
+    update_freq: int = 50
+    gamma: float = 0.99
+    learning_rate: float = 0.0001
+
+
 def batchify(data, batch_size):
     return [data[i:i + batch_size] for i in range(0, len(data), batch_size)]
 
 
-def update_weights(agent_replay_buffer, agent_policy_model, agent_target_model, agent_optimizer, device='cpu'):
-    batch = random.sample(agent_replay_buffer, BUFFER_SIZE)
+def stack_hidden(hiddens, hidden_size, device):
+    """Packs per-agent (h, c) LSTM states (or None) into one (1, N, hidden)
+    pair; missing states become zeros."""
+    h = torch.zeros(1, len(hiddens), hidden_size, device=device)
+    c = torch.zeros(1, len(hiddens), hidden_size, device=device)
+    for k, hidden in enumerate(hiddens):
+        if hidden is not None:
+            h[:, k] = hidden[0][:, 0]
+            c[:, k] = hidden[1][:, 0]
+    return h, c
+
+
+def update_weights(cfg, agent_replay_buffer, agent_policy_model, agent_target_model, agent_optimizer, device='cpu'):
+    batch = random.sample(agent_replay_buffer, cfg.batch_size)
 
-    mini_batches = batchify(batch, BATCH_SIZE)
+    mini_batches = batchify(batch, cfg.batch_size)
     for minibatch in mini_batches:
-        # Compute target Q-values and optimize
-        q_values_batch = []
-        target_q_values = []
-        for obs_mn, action_mn, reward_mn, done_mn, next_obs_mn, hidden_state_mn, next_hidden_state_mn in minibatch:
-            with torch.no_grad():
-                next_obs = torch.tensor(next_obs_mn, dtype=torch.float32).unsqueeze(0).to(device)
-                next_action = torch.argmax(agent_policy_model(next_obs, next_hidden_state_mn)[0])
-                target_q_value = reward_mn + GAMMA * (1 - done_mn) * \
-                                 agent_target_model(next_obs, next_hidden_state_mn)[0].squeeze(0)[next_action]
-                target_q_values.append(target_q_value)
-            q_values, _ = agent_policy_model(torch.tensor(obs_mn, dtype=torch.float32, device=device).unsqueeze(0), hidden_state_mn)
-            q_value = q_values.gather(1, action_mn.view(1, 1)).squeeze()
-            q_values_batch.append(q_value)
-        target_q_values = torch.stack(target_q_values)
-
-        q_values_batch = torch.stack((q_values_batch))
+        observations, actions, rewards, dones, next_observations, hidden_states_mb, next_hidden_states_mb = zip(*minibatch)
+
+        hidden_size = agent_policy_model.lstm.hidden_size
+        obs_batch = torch.as_tensor(np.stack(observations), dtype=torch.float32).to(device)
+        next_obs_batch = torch.stack(
+            [torch.as_tensor(o, dtype=torch.float32).to(device) for o in next_observations])
+        action_batch = torch.stack([torch.as_tensor(a) for a in actions]).long().to(device)
+        reward_batch = torch.tensor(rewards, dtype=torch.float32, device=device)
+        done_batch = torch.tensor(dones, dtype=torch.float32, device=device)
+        hidden_batch = stack_hidden(hidden_states_mb, hidden_size, device)
+        next_hidden_batch = stack_hidden(next_hidden_states_mb, hidden_size, device)
+
+        # Double DQN target: the policy net picks the next action, the
+        # target net scores it - one forward pass per model for the batch
+        with torch.no_grad():
+            next_q_policy, _ = agent_policy_model(next_obs_batch, next_hidden_batch)
+            next_actions = torch.argmax(next_q_policy, dim=1, keepdim=True)
+            next_q_target, _ = agent_target_model(next_obs_batch, next_hidden_batch)
+            target_q_values = reward_batch + cfg.gamma * (1 - done_batch) * \
+                              next_q_target.gather(1, next_actions).squeeze(1)
+
+        q_values, _ = agent_policy_model(obs_batch, hidden_batch)
+        q_values_batch = q_values.gather(1, action_batch.view(-1, 1)).squeeze(1)
+
         loss = torch.nn.functional.mse_loss(q_values_batch, target_q_values)
 
         # Optimize the shared network
@@ -48,16 +84,6 @@ def update_weights(agent_replay_buffer, agent_policy_model, agent_target_model,
         loss.backward()
         torch.nn.utils.clip_grad_norm_(agent_policy_model.parameters(), 1.0)
         agent_optimizer.step()
-
-    if i % UPDATE_FREQ == 0:
-        agent_target_model.load_state_dict(agent_policy_model.state_dict())
-
-        torch.save(predator_target_model.state_dict(), "predator_target_model.pth")
-        torch.save(predator_policy_model.state_dict(), "predator_policy_model.pth")
-        torch.save(prey_target_model.state_dict(), "prey_target_model.pth")
-        torch.save(prey_policy_model.state_dict(), "prey_policy_model.pth")
-
-    agent_replay_buffer.clear()
 # Wrapping the environment - Can be added in the future
 
 def env_creator():
@@ -90,12 +116,8 @@ if __name__ == "__main__":
         print("WARNING: running without tests...")    
 
     # Hyperparameters
-    BUFFER_SIZE = 64
-    BATCH_SIZE = 64
-    EPSILON = 0.1
-    UPDATE_FREQ = 50
-    GAMMA = 0.99
-    LEARNING_RATE = 0.0001
+    cfg = TrainCfg()
+    EPSILON = cfg.epsilon
 
     env = env_creator()
     obs = env.reset()
@@ -103,19 +125,26 @@ if __name__ == "__main__":
 
     csv_file = 'output_ENV_1_more_hunger_ceil.csv'
     data = []
+    # Open the results file once; rows are flushed on the print cadence
+    # and the handle is closed on interpreter exit even if the run crashes
+    csv_handle = open(csv_file, mode='a', newline='')
+    csv_writer = csv.writer(csv_handle)
+    atexit.register(csv_handle.close)
 
-    predator_replay_buffer = deque()
-    prey_replay_buffer = deque()
+    # Persistent experience buffers; the maxlen drops the oldest entries
+    # instead of clearing the whole buffer after every update
+    predator_replay_buffer = deque(maxlen=cfg.buffer_size)
+    prey_replay_buffer = deque(maxlen=cfg.buffer_size)
 
     # Models
-    predator_policy_model = DDQNLSTM((7, 11, 11), 4).to(device)
-    predator_target_model = DDQNLSTM((7, 11, 11), 4).to(device)
-    prey_policy_model = DDQNLSTM((7, 11, 11), 4).to(device)
-    prey_target_model = DDQNLSTM((7, 11, 11), 4).to(device)
+    predator_policy_model = maybe_compile(DDQNLSTM((7, 11, 11), 4).to(device))
+    predator_target_model = maybe_compile(DDQNLSTM((7, 11, 11), 4).to(device))
+    prey_policy_model = maybe_compile(DDQNLSTM((7, 11, 11), 4).to(device))
+    prey_target_model = maybe_compile(DDQNLSTM((7, 11, 11), 4).to(device))
 
     # Optimizers
-    predator_optimizer = optim.Adam(predator_policy_model.parameters(), lr=LEARNING_RATE)
-    prey_optimizer = optim.Adam(prey_policy_model.parameters(), lr=LEARNING_RATE)
+    predator_optimizer = optim.Adam(predator_policy_model.parameters(), lr=cfg.learning_rate)
+    prey_optimizer = optim.Adam(prey_policy_model.parameters(), lr=cfg.learning_rate)
 
     hidden_states = {agent.id: None for agent in env.agents}
     new_hidden_states = {agent.id: None for agent in env.agents}
@@ -130,7 +159,7 @@ if __name__ == "__main__":
                 hidden_states[agent.id] = None
             else:
                 hidden_state = hidden_states[agent.id]
-            if agent.role == 'predator':
+            if agent.role == ROLE_PREDATOR:
                 action_values, new_hidden_state = predator_policy_model(obs_tensor, hidden_state)
             else:
                 action_values, new_hidden_state = prey_policy_model(obs_tensor, hidden_state)
@@ -163,26 +192,42 @@ if __name__ == "__main__":
                 prey_replay_buffer.append(experience)
 
         # env.generate_new_agents()
-        if len(predator_replay_buffer) >= BUFFER_SIZE:
-            # Sample a minibatch and train (same as before)
-            update_weights(predator_replay_buffer, predator_policy_model, predator_target_model, predator_optimizer, device)
-        if len(prey_replay_buffer) >= BUFFER_SIZE:
-            # Sample a minibatch and train (same as before)
-            update_weights(prey_replay_buffer, prey_policy_model, prey_target_model, prey_optimizer, device)
-
-
-        num_predators = len([a for a in env.agents if "predator" in a.role])
-        num_preys = len([a for a in env.agents if "prey" in a.role])
+        # The buffers persist between updates, so training runs every
+        # train_every steps on a sample of the accumulated experience
+        if i % cfg.train_every == 0:
+            if len(predator_replay_buffer) >= cfg.batch_size:
+                update_weights(cfg, predator_replay_buffer, predator_policy_model, predator_target_model, predator_optimizer, device)
+            if len(prey_replay_buffer) >= cfg.batch_size:
+                update_weights(cfg, prey_replay_buffer, prey_policy_model, prey_target_model, prey_optimizer, device)
+
+        # Target sync follows the step counter, independent of how often
+        # training itself runs
+        if i % cfg.update_freq == 0:
+            predator_target_model.load_state_dict(predator_policy_model.state_dict())
+            prey_target_model.load_state_dict(prey_policy_model.state_dict())
+
+            torch.save(predator_target_model.state_dict(), "predator_target_model.pth")
+            torch.save(predator_policy_model.state_dict(), "predator_policy_model.pth")
+            torch.save(prey_target_model.state_dict(), "prey_target_model.pth")
+            torch.save(prey_policy_model.state_dict(), "prey_policy_model.pth")
+
+
+        # Split the population once per iteration; the counts, the stats
+        # and the CSV row all reuse the same two lists
+        predators = [a for a in env.agents if a.role == ROLE_PREDATOR]
+        preys = [a for a in env.agents if a.role == ROLE_PREY]
+        num_predators = len(predators)
+        num_preys = len(preys)
         data.append([i, num_predators, num_preys])
 
         obs = new_obs
-        hidden_state = new_hidden_states
+        # Hand over the fresh LSTM states and start a new dict, so the
+        # states saved with the next step's experiences are the pre-step
+        # ones (the old code never reassigned hidden_states at all)
+        hidden_states = new_hidden_states
+        new_hidden_states = {}
         #print(i, num_predators, num_preys)
 
-        predators = [a for a in env.agents if "predator" in a.role]
-        preys = [a for a in env.agents if "prey" in a.role]
-        num_predators = len(predators)
-        num_preys = len(preys)
         avg_attack = np.mean([agent.attack for agent in predators]) if num_predators > 0 else 0
         avg_speed_predators = np.mean([agent.speed for agent in predators]) if num_predators > 0 else 0
         avg_resilience = np.mean([agent.resilience for agent in preys]) if num_preys > 0 else 0
@@ -193,11 +238,12 @@ if __name__ == "__main__":
 
 
 
-        with open(csv_file, mode='a', newline='') as file:  # Open in append mode
-            writer = csv.writer(file)
-            # writer.writerow([i, num_predators, num_preys])
-            writer.writerow([i, num_predators, num_preys, avg_attack, avg_speed_predators, avg_resilience, avg_speed_preys])
+        # csv_writer.writerow([i, num_predators, num_preys])
+        csv_writer.writerow([i, num_predators, num_preys, avg_attack, avg_speed_predators, avg_resilience, avg_speed_preys])
+        if i % 10 == 0:
+            csv_handle.flush()
 
+    csv_handle.close()
     torch.save(predator_target_model.state_dict(), "predator_target_model.pth")
     torch.save(predator_policy_model.state_dict(), "predator_policy_model.pth")
 